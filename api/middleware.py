@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+# Sheds load with 503 when requests are queueing for this server, or when this worker's mean
+# response time over the last few seconds is too high. Queue depth is the uWSGI listen queue
+# (connections accepted by the kernel but not yet picked up by a worker), so that check only
+# applies when running under uWSGI, as on PythonAnywhere.
+class LoadSheddingMiddleware:
+    timer = time.monotonic
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_queue = getattr(settings, 'LOAD_SHEDDING_MAX_QUEUE', 10)
+        self.max_latency = getattr(settings, 'LOAD_SHEDDING_MAX_LATENCY', 2.0)
+        self.min_samples = getattr(settings, 'LOAD_SHEDDING_MIN_SAMPLES', 10)
+        self.window = getattr(settings, 'LOAD_SHEDDING_WINDOW', 10.0)
+        self.retry_after = getattr(settings, 'LOAD_SHEDDING_RETRY_AFTER', 5)
+        self.lock = threading.Lock()
+        # (finished at, seconds taken) for requests served within the window
+        self.samples = deque()
+        self.total = 0.0
+
+    def __call__(self, request):
+        if uwsgi is not None and uwsgi.listen_queue() > self.max_queue:
+            return self.shed()
+
+        if self.mean_latency(self.timer()) > self.max_latency:
+            return self.shed()
+
+        start = self.timer()
+        try:
+            return self.get_response(request)
+        finally:
+            end = self.timer()
+            with self.lock:
+                self.samples.append((end, end - start))
+                self.total += end - start
+
+    # Samples age out of the window, so a shedding worker recovers after at most one window
+    def mean_latency(self, now):
+        with self.lock:
+            while self.samples and self.samples[0][0] <= now - self.window:
+                self.total -= self.samples.popleft()[1]
+            if not self.samples:
+                self.total = 0.0
+            # A handful of slow requests on a quiet worker is not overload
+            if len(self.samples) < self.min_samples:
+                return 0.0
+            return self.total / len(self.samples)
+
+    def shed(self):
+        response = JsonResponse({
+            'error': 'Service Unavailable',
+            'code': status.HTTP_503_SERVICE_UNAVAILABLE,
+            'details': 'Server is overloaded, please retry later'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(self.retry_after)
+        return response
@@ -1,3 +1,212 @@
-from django.test import TestCase
+from unittest import mock
+import fakeredis
+import redis
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from .middleware import LoadSheddingMiddleware
+from .models import Module
+from .throttling import TOKEN_BUCKET_SCRIPT, TokenBucketThrottle
 
-# Create your tests here.
+THROTTLE_SETTINGS = {
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'read': '3/min', 'write': '2/min', 'register': '1/hour', 'login': '2/min'},
+}
+
+# Token bucket throttling against the API, with caching of responses turned off
+@override_settings(CACHE_MIDDLEWARE_SECONDS=0, REST_FRAMEWORK=THROTTLE_SETTINGS)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        Module.objects.create(code='CD1', name='Computing')
+        self.client = APIClient(REMOTE_ADDR='10.0.0.1')
+        store = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        for patcher in [
+            mock.patch.object(TokenBucketThrottle, 'script', store.register_script(TOKEN_BUCKET_SCRIPT)),
+            mock.patch.object(TokenBucketThrottle, 'unavailable_until', 0),
+            mock.patch.object(TokenBucketThrottle, 'timer', mock.Mock(return_value=1000.0)),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def authenticate(self, client, username):
+        user = User.objects.create_user(username=username, password='password')
+        token = Token.objects.create(user=user)
+        client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def read(self, client=None, **extra):
+        return (client or self.client).get('/api/modules/', **extra)
+
+    def write(self, client=None):
+        return (client or self.client).post('/api/ratings/', {}, format='json')
+
+    def test_read_budget_exhausted(self):
+        for _ in range(3):
+            self.assertEqual(self.read().status_code, 200)
+        response = self.read()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+
+    def test_write_budget_exhausted(self):
+        self.authenticate(self.client, 'writer')
+        for _ in range(2):
+            self.assertNotEqual(self.write().status_code, 429)
+        response = self.write()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Reads have their own budget
+        self.assertEqual(self.read().status_code, 200)
+
+    def test_bucket_refills(self):
+        for _ in range(3):
+            self.read()
+        self.assertEqual(self.read().status_code, 429)
+
+        TokenBucketThrottle.timer.return_value = 1020.0
+        self.assertEqual(self.read().status_code, 200)
+        self.assertEqual(self.read().status_code, 429)
+
+        # An idle bucket refills only up to its capacity
+        TokenBucketThrottle.timer.return_value = 5000.0
+        for _ in range(3):
+            self.assertEqual(self.read().status_code, 200)
+        self.assertEqual(self.read().status_code, 429)
+
+    def test_register_has_own_budget(self):
+        data = {'username': 'new', 'email': 'new@example.com', 'password': 'password'}
+        self.assertEqual(self.client.post('/api/register/', data, format='json').status_code, 201)
+        response = self.client.post('/api/register/', data, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.read().status_code, 200)
+
+    def test_login_has_own_budget(self):
+        User.objects.create_user(username='user', password='password')
+        data = {'username': 'user', 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api-token-auth/', data, format='json').status_code, 400)
+        response = self.client.post('/api-token-auth/', data, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_users_bucketed_separately(self):
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.authenticate(self.client, 'first')
+        self.authenticate(other, 'second')
+        for _ in range(3):
+            self.read()
+        self.assertEqual(self.read().status_code, 429)
+        self.assertEqual(self.read(other).status_code, 200)
+
+    def test_user_bucket_applies_across_ips(self):
+        self.authenticate(self.client, 'roaming')
+        for _ in range(3):
+            self.read()
+        self.assertEqual(self.read(REMOTE_ADDR='10.0.0.2').status_code, 429)
+
+    def test_ip_bucket_applies_to_authenticated_users(self):
+        other = APIClient(REMOTE_ADDR='10.0.0.1')
+        self.authenticate(self.client, 'first')
+        self.authenticate(other, 'second')
+        for _ in range(3):
+            self.read()
+        self.assertEqual(self.read(other).status_code, 429)
+
+    def test_ips_bucketed_separately(self):
+        for _ in range(3):
+            self.read()
+        self.assertEqual(self.read().status_code, 429)
+        self.assertEqual(self.read(APIClient(REMOTE_ADDR='10.0.0.2')).status_code, 200)
+
+    def test_forwarded_for_cannot_be_spoofed(self):
+        for address in ['1.1.1.1', '2.2.2.2', '3.3.3.3']:
+            self.read(HTTP_X_FORWARDED_FOR=address + ', 10.0.0.9')
+        response = self.read(HTTP_X_FORWARDED_FOR='4.4.4.4, 10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    def test_store_unavailable_allows_requests(self):
+        TokenBucketThrottle.script = mock.Mock(side_effect=redis.ConnectionError('refused'))
+        with self.assertLogs('api.throttling', 'WARNING') as logs:
+            for _ in range(5):
+                self.assertEqual(self.read().status_code, 200)
+        self.assertEqual(len(logs.output), 1)
+
+    @override_settings(THROTTLE_REDIS_URL='redis://127.0.0.1:1/0')
+    def test_configured_store_unreachable(self):
+        TokenBucketThrottle.script = None
+        with self.assertLogs('api.throttling', 'WARNING'):
+            for _ in range(5):
+                self.assertEqual(self.read().status_code, 200)
+
+    def test_redis_not_installed(self):
+        with mock.patch('api.throttling.redis', None), self.assertLogs('api.throttling', 'WARNING'):
+            for _ in range(5):
+                self.assertEqual(self.read().status_code, 200)
+
+# Load shedding on queue depth and recent latency
+@override_settings(LOAD_SHEDDING_MAX_QUEUE=10, LOAD_SHEDDING_MAX_LATENCY=2.0,
+                   LOAD_SHEDDING_MIN_SAMPLES=3, LOAD_SHEDDING_WINDOW=10.0, LOAD_SHEDDING_RETRY_AFTER=5)
+class LoadSheddingTests(TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.latency = 0.0
+
+        def get_response(request):
+            self.now += self.latency
+            return HttpResponse()
+
+        self.middleware = LoadSheddingMiddleware(get_response)
+        self.middleware.timer = lambda: self.now
+        self.factory = RequestFactory()
+
+    def call(self):
+        return self.middleware(self.factory.get('/api/modules/'))
+
+    def assertShed(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_sheds_on_queue_depth(self):
+        server = mock.Mock()
+        with mock.patch('api.middleware.uwsgi', server):
+            server.listen_queue.return_value = 11
+            self.assertShed(self.call())
+            server.listen_queue.return_value = 10
+            self.assertEqual(self.call().status_code, 200)
+
+    def test_sheds_on_latency_and_recovers(self):
+        self.latency = 3.0
+        for _ in range(3):
+            self.assertEqual(self.call().status_code, 200)
+        self.latency = 0.0
+        for _ in range(5):
+            self.assertShed(self.call())
+
+        # Recovery depends on time passing, not on how many requests were shed
+        self.now += 0.5
+        self.assertShed(self.call())
+        self.now += 10.0
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_single_slow_request_does_not_shed(self):
+        self.latency = 10.5
+        self.call()
+        self.latency = 0.0
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_idle_worker_recovers(self):
+        self.latency = 10.5
+        for _ in range(3):
+            self.call()
+        self.now += 3600
+        self.assertEqual(self.call().status_code, 200)
+
+    def test_fast_requests_dilute_slow_one(self):
+        self.latency = 0.1
+        for _ in range(5):
+            self.call()
+        self.latency = 3.0
+        self.call()
+        self.assertEqual(self.call().status_code, 200)
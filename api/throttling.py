@@ -0,0 +1,134 @@
+import logging
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Refills every bucket in KEYS by the time since it was last used, then spends one token from
+# each only if all of them have one. Runs inside Redis, so the check and the update are atomic.
+# ARGV: capacity, tokens per second, now. Returns {allowed, seconds to wait} as strings
+# because Redis truncates Lua numbers to integers.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(bucket[1]) or capacity
+    local last = tonumber(bucket[2]) or now
+    level = math.min(capacity, level + math.max(0, now - last) * rate)
+    tokens[i] = level
+    if level < 1 then
+        wait = math.max(wait, (1 - level) / rate)
+    end
+end
+if wait > 0 then
+    return {'0', tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {'1', '0'}
+"""
+
+# Token bucket throttle kept in Redis (THROTTLE_REDIS_URL), which every worker process shares.
+# Each decision is a single EVALSHA round trip. Requests are checked against a bucket for their
+# IP and, once authenticated, a bucket for their user as well. If Redis is missing or unreachable
+# requests are let through unthrottled and a warning is logged once per outage.
+class TokenBucketThrottle(BaseThrottle):
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+    timer = time.time
+    scope = None
+    # Shared by all throttles in this process
+    script = None
+    unavailable_until = 0
+    retry_interval = 30
+
+    def get_rate(self, scope):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[scope]
+        except KeyError:
+            msg = "No default throttle rate set for '%s' scope" % scope
+            raise ImproperlyConfigured(msg)
+
+    # Parse a DRF style "<requests>/<period>" rate into bucket size and tokens per second
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        num_requests = int(num)
+        return num_requests, num_requests / PERIODS[period[0]]
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_idents(self, request):
+        idents = ['ip_%s' % self.get_ident(request)]
+        if request.user and request.user.is_authenticated:
+            idents.append('user_%s' % request.user.pk)
+        return idents
+
+    def get_script(self):
+        if TokenBucketThrottle.script is None:
+            client = redis.Redis.from_url(
+                settings.THROTTLE_REDIS_URL, socket_connect_timeout=0.1, socket_timeout=0.1
+            )
+            TokenBucketThrottle.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        return TokenBucketThrottle.script
+
+    def allow_request(self, request, view):
+        now = self.timer()
+        if now < TokenBucketThrottle.unavailable_until:
+            return True
+        if redis is None:
+            self.store_unavailable(now, 'the redis package is not installed')
+            return True
+
+        scope = self.get_scope(request, view)
+        capacity, refill_rate = self.parse_rate(self.get_rate(scope))
+        keys = [self.cache_format % {'scope': scope, 'ident': ident} for ident in self.get_idents(request)]
+
+        try:
+            allowed, wait = self.get_script()(keys=keys, args=[capacity, refill_rate, now])
+        except redis.RedisError as e:
+            self.store_unavailable(now, e)
+            return True
+
+        TokenBucketThrottle.unavailable_until = 0
+        self.wait_time = float(wait)
+        return allowed == b'1'
+
+    # Skip the store for a while rather than paying a connection timeout on every request
+    def store_unavailable(self, now, reason):
+        if not TokenBucketThrottle.unavailable_until:
+            logger.warning('Throttle store unavailable, not throttling requests: %s', reason)
+        TokenBucketThrottle.unavailable_until = now + self.retry_interval
+
+    def wait(self):
+        return self.wait_time
+
+# Separate read and write budgets for the API viewsets
+class ReadWriteThrottle(TokenBucketThrottle):
+    def get_scope(self, request, view):
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+# Budget for account registration
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+# Budget for token login, which hashes a password on every attempt
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
@@ -4,16 +4,18 @@ from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
 from django.core.cache import cache
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.reverse import reverse
 from .models import Professor, Module, ModuleInstance, Rating
 from .serializers import *
+from .throttling import RegisterThrottle
 
 # Endpoint for user registration; allows any user to register
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterThrottle])
 def register_user(request):
     # Retrieve registration data from the request
     username = request.data.get('username')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,6 +59,17 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ReadWriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '120/min',
+        'write': '30/min',
+        'register': '5/hour',
+        'login': '10/min',
+    },
+    # PythonAnywhere puts one proxy in front of the app; trust only the address it appends
+    'NUM_PROXIES': 1,
 }
 
 CACHE_MIDDLEWARE_ALIAS = 'default'
@@ -71,8 +83,24 @@ CACHES = {
     }
 }
 
+# Redis server holding the api.throttling token buckets, shared by every worker process.
+# Deploying with throttling needs a reachable Redis server and the redis package from
+# requirements.txt; set THROTTLE_REDIS_URL to point at it. While Redis is unreachable
+# requests are served unthrottled and a warning is logged.
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', 'redis://127.0.0.1:6379/1')
+
+# Shed load with 503 once this many connections wait in the uWSGI listen queue, or once
+# mean response time (seconds) over the last LOAD_SHEDDING_WINDOW seconds exceeds
+# LOAD_SHEDDING_MAX_LATENCY across at least LOAD_SHEDDING_MIN_SAMPLES requests
+LOAD_SHEDDING_MAX_QUEUE = 10
+LOAD_SHEDDING_MAX_LATENCY = 2.0
+LOAD_SHEDDING_MIN_SAMPLES = 10
+LOAD_SHEDDING_WINDOW = 10.0
+LOAD_SHEDDING_RETRY_AFTER = 5
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -16,12 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework.authtoken.views import obtain_auth_token
+from rest_framework.authtoken.views import ObtainAuthToken
+from api.throttling import LoginThrottle
 from api.views import register_user
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/register/', register_user, name='register'),
-    path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
+    path('api-token-auth/', ObtainAuthToken.as_view(throttle_classes=[LoginThrottle]), name='api_token_auth'),
     path('api/', include('api.urls')),
 ]